@@ -1,19 +1,25 @@
 #!/usr/bin/env python3
 
+import numpy as np
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import orjson
 import time
 import sys
 import os
+import re
+import threading
 import argparse
+import functools
 import logging
 import hashlib
-import random
+import zlib
 import unittest
 from datetime import datetime, timedelta
-from sklearn.preprocessing import MinMaxScaler
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,67 +31,247 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_ADDRESS_RE = re.compile(r'0x[0-9a-fA-F]{40}')
+
+_HIGH_FREQ_MINT_OFFSETS = np.arange(50) * 3600
+_HIGH_FREQ_BORROW_OFFSETS = np.arange(80) * 3600
+
+
+def _make_events(times, amounts, symbols):
+    return [
+        {
+            'blockTime': str(int(t)),
+            'underlyingAmount': str(a),
+            'cTokenSymbol': s
+        } for t, a, s in zip(times, amounts, symbols)
+    ]
+
+@functools.lru_cache(maxsize=4096)
+def _simulate_wallet_data(wallet_address):
+    seed = zlib.crc32(wallet_address.encode())
+    rng = np.random.default_rng(seed)
+
+    current_time = int(datetime.now().timestamp())
+    base_time = current_time - int(rng.integers(86400 * 30, 86400 * 365, endpoint=True))
+
+    wallet_type = seed % 5
+    tokens = ['cUSDC', 'cDAI', 'cUSDT', 'cWBTC', 'cETH']
+    liquidation_events = []
+
+    if wallet_type == 0:  # Conservative
+        n_mints = int(rng.integers(3, 8, endpoint=True))
+        mint_times = base_time + np.arange(n_mints) * 86400 * rng.integers(7, 30, size=n_mints, endpoint=True)
+        mint_amounts = rng.uniform(1000, 10000, size=n_mints)
+        mint_symbols = rng.choice(tokens[:3], size=n_mints)
+
+        n_borrows = int(rng.integers(1, 4, endpoint=True))
+        borrow_times = base_time + np.arange(n_borrows) * 86400 * rng.integers(30, 60, size=n_borrows, endpoint=True)
+        borrow_amounts = rng.uniform(500, 3000, size=n_borrows)
+        borrow_symbols = rng.choice(tokens[:2], size=n_borrows)
+
+        repay_times = borrow_times + 86400 * 30
+        repay_amounts = borrow_amounts * 1.1
+        repay_symbols = borrow_symbols
+
+        redeem_times = mint_times[:2] + 86400 * 60
+        redeem_amounts = mint_amounts[:2] * 0.5
+        redeem_symbols = mint_symbols[:2]
+
+    elif wallet_type == 1:  # Risky
+        mint_times = base_time + np.arange(2) * 86400
+        mint_amounts = rng.uniform(500, 2000, size=2)
+        mint_symbols = rng.choice(tokens, size=2)
+
+        n_borrows = int(rng.integers(3, 6, endpoint=True))
+        borrow_times = base_time + np.arange(n_borrows) * 86400 * 7
+        borrow_amounts = rng.uniform(3000, 8000, size=n_borrows)
+        borrow_symbols = rng.choice(tokens[:3], size=n_borrows)
+
+        n_repays = n_borrows // 2
+        repay_times = borrow_times[:n_repays] + 86400 * 10
+        repay_amounts = borrow_amounts[:n_repays] * 0.4
+        repay_symbols = borrow_symbols[:n_repays]
+
+        redeem_times, redeem_amounts, redeem_symbols = [], [], []
+        liquidation_events = [
+            {
+                'blockTime': str(base_time + 86400 * 60),
+                'repayAmount': str(rng.uniform(2000, 5000)),
+                'seizeTokens': str(rng.uniform(1000, 3000))
+            }
+        ]
+
+    elif wallet_type == 2:  # High frequency
+        mint_times = base_time + _HIGH_FREQ_MINT_OFFSETS
+        mint_amounts = rng.uniform(100, 500, size=50)
+        mint_symbols = rng.choice(tokens, size=50)
+
+        borrow_times = base_time + _HIGH_FREQ_BORROW_OFFSETS
+        borrow_amounts = rng.uniform(100, 500, size=80)
+        borrow_symbols = rng.choice(tokens, size=80)
+
+        repay_times = borrow_times + 3600
+        repay_amounts = borrow_amounts
+        repay_symbols = borrow_symbols
+
+        redeem_times = mint_times[:20] + 3600 * 2
+        redeem_amounts = mint_amounts[:20] * 0.8
+        redeem_symbols = mint_symbols[:20]
+
+    elif wallet_type == 3:  # Defaulted
+        mint_times, mint_amounts, mint_symbols = [base_time], [2000], ['cUSDC']
+        borrow_times, borrow_amounts, borrow_symbols = [base_time + 86400 * 7], [5000], ['cUSDC']
+        repay_times, repay_amounts, repay_symbols = [], [], []
+        redeem_times, redeem_amounts, redeem_symbols = [], [], []
+        liquidation_events = [
+            {
+                'blockTime': str(base_time + 86400 * 30),
+                'repayAmount': str(5000),
+                'seizeTokens': str(2000)
+            }
+        ]
+
+    else:  # Diversified
+        mint_times = base_time + np.arange(5) * 86400 * 10
+        mint_amounts = rng.uniform(1000, 3000, size=5)
+        mint_symbols = rng.choice(tokens, size=5)
+
+        borrow_times = base_time + np.arange(3) * 86400 * 20
+        borrow_amounts = rng.uniform(800, 2000, size=3)
+        borrow_symbols = rng.choice(tokens[:3], size=3)
+
+        repay_times = borrow_times + 86400 * 15
+        repay_amounts = borrow_amounts * 0.9
+        repay_symbols = borrow_symbols
+
+        redeem_times = mint_times[:2] + 86400 * 45
+        redeem_amounts = mint_amounts[:2] * 0.3
+        redeem_symbols = mint_symbols[:2]
+
+    mint_events = _make_events(mint_times, mint_amounts, mint_symbols)
+    borrow_events = _make_events(borrow_times, borrow_amounts, borrow_symbols)
+    repay_events = _make_events(repay_times, repay_amounts, repay_symbols)
+    redeem_events = _make_events(redeem_times, redeem_amounts, redeem_symbols)
+
+    unique_tokens = set(mint_symbols) | set(borrow_symbols)
+    account_tokens = []
+    for token in unique_tokens:
+        account_tokens.append({
+            'symbol': token,
+            'supplyBalanceUnderlying': str(rng.uniform(0, 10000)),
+            'borrowBalanceUnderlying': str(rng.uniform(0, 5000))
+        })
+
+    return {
+        'account': {
+            'tokens': account_tokens,
+            'countLiquidated': len(liquidation_events),
+            'hasBorrowed': len(borrow_events) > 0
+        },
+        'mintEvents': mint_events,
+        'borrowEvents': borrow_events,
+        'repayEvents': repay_events,
+        'redeemEvents': redeem_events,
+        'liquidationEvents': liquidation_events
+    }
+
 class CompoundWalletScorer:
-    
-    def __init__(self, use_simulation=False, max_workers=5):
+
+    __slots__ = (
+        'api_url', 'headers', 'use_simulation', 'max_workers', 'cache_dir',
+        'session', '_rate_lock', '_next_request_time', 'features_df', 'scores_df'
+    )
+
+    BATCH_SIZE = 25
+    CHUNK_SIZE = 1024
+    REQUESTS_PER_SECOND = 5
+    PARALLEL_SIM_THRESHOLD = 256
+    EVENT_KINDS = ('mint', 'borrow', 'repay', 'redeem', 'liquidation')
+
+    FEATURE_DTYPES = {
+        'total_deposits': 'float32', 'total_borrows': 'float32',
+        'total_repays': 'float32', 'total_redeems': 'float32',
+        'current_supply': 'float32', 'current_borrow': 'float32',
+        'deposit_count': 'int32', 'borrow_count': 'int32',
+        'repay_count': 'int32', 'redeem_count': 'int32',
+        'liquidation_count': 'int32', 'borrow_to_deposit_ratio': 'float32',
+        'repay_rate': 'float32', 'health_factor': 'float32',
+        'unique_tokens_used': 'int16', 'activity_duration_days': 'float32',
+        'activity_frequency': 'float32'
+    }
+
+    def __init__(self, use_simulation=False, max_workers=5, cache_dir='.wallet_cache'):
         self.api_url = "https://api.thegraph.com/subgraphs/name/graphprotocol/compound-v2"
         self.headers = {"Content-Type": "application/json"}
         self.use_simulation = use_simulation
         self.max_workers = max_workers
+        self.cache_dir = cache_dir
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.headers.update(self.headers)
+
+        self._rate_lock = threading.Lock()
+        self._next_request_time = 0.0
         self.features_df = None
         self.scores_df = None
         
         logger.info(f"Initialized DeFi Wallet Risk Scorer - Mode: {'Simulation' if use_simulation else 'Real API'}")
 
     def validate_wallet_address(self, wallet_address):
-        if not isinstance(wallet_address, str) or len(wallet_address) != 42 or not wallet_address.startswith('0x'):
-            return False
-        try:
-            int(wallet_address[2:], 16)
-            return True
-        except:
-            return False
+        return isinstance(wallet_address, str) and _ADDRESS_RE.fullmatch(wallet_address) is not None
+
+    def _throttle(self):
+        with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_request_time - now
+            self._next_request_time = max(now, self._next_request_time) + 1.0 / self.REQUESTS_PER_SECOND
+        if wait > 0:
+            time.sleep(wait)
+
+    WALLET_QUERY = """
+    query($wallet: String!) {
+      account(id: $wallet) {
+        tokens {
+          supplyBalanceUnderlying
+          borrowBalanceUnderlying
+        }
+      }
+      mintEvents: mintEvents(where: {to: $wallet}, first: 1000) {
+        blockTime underlyingAmount cTokenSymbol
+      }
+      borrowEvents: borrowEvents(where: {borrower: $wallet}, first: 1000) {
+        blockTime underlyingAmount cTokenSymbol
+      }
+      repayEvents: repayEvents(where: {borrower: $wallet}, first: 1000) {
+        blockTime underlyingAmount cTokenSymbol
+      }
+      redeemEvents: redeemEvents(where: {from: $wallet}, first: 1000) {
+        blockTime underlyingAmount cTokenSymbol
+      }
+      liquidationEvents: liquidationEvents(where: {borrower: $wallet}, first: 1000) {
+        blockTime
+      }
+    }
+    """
 
     def _fetch_from_thegraph(self, wallet_address, retries=3):
         for attempt in range(retries):
             try:
-                query = """
-                query($wallet: String!) {
-                  account(id: $wallet) {
-                    tokens { 
-                      symbol 
-                      supplyBalanceUnderlying 
-                      borrowBalanceUnderlying 
-                    }
-                    countLiquidated
-                    hasBorrowed
-                  }
-                  mintEvents: mintEvents(where: {to: $wallet}, first: 1000) {
-                    blockTime underlyingAmount cTokenSymbol
-                  }
-                  borrowEvents: borrowEvents(where: {borrower: $wallet}, first: 1000) {
-                    blockTime underlyingAmount cTokenSymbol
-                  }
-                  repayEvents: repayEvents(where: {borrower: $wallet}, first: 1000) {
-                    blockTime underlyingAmount cTokenSymbol
-                  }
-                  redeemEvents: redeemEvents(where: {from: $wallet}, first: 1000) {
-                    blockTime underlyingAmount cTokenSymbol
-                  }
-                  liquidationEvents: liquidationEvents(where: {borrower: $wallet}, first: 1000) {
-                    blockTime repayAmount seizeTokens
-                  }
-                }
-                """
                 
-                response = requests.post(
-                    self.api_url, 
-                    json={"query": query, "variables": {"wallet": wallet_address}}, 
-                    headers=self.headers, 
+                self._throttle()
+                response = self.session.post(
+                    self.api_url,
+                    json={"query": self.WALLET_QUERY, "variables": {"wallet": wallet_address}},
                     timeout=30
                 )
                 response.raise_for_status()
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 if "errors" in data:
                     if attempt < retries - 1:
@@ -102,186 +288,178 @@ class CompoundWalletScorer:
                 
         return None
 
+    def _cache_path(self, wallet_address):
+        day_bucket = datetime.now().strftime('%Y%m%d')
+        key = hashlib.blake2b(f"{wallet_address}:{day_bucket}".encode(), digest_size=16).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _cache_get(self, wallet_address):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(wallet_address)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _cache_put(self, wallet_address, data):
+        if not self.cache_dir or data is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self._cache_path(wallet_address), 'w') as f:
+                json.dump(data, f)
+        except OSError as e:
+            logger.warning(f"Could not cache data for {wallet_address}: {e}")
+
+    def _build_batch_query(self, wallet_addresses):
+        parts = []
+        for i, wallet in enumerate(wallet_addresses):
+            parts.append(f"""
+                account{i}: account(id: "{wallet}") {{
+                    tokens {{
+                        supplyBalanceUnderlying
+                        borrowBalanceUnderlying
+                    }}
+                }}
+                mint{i}: mintEvents(where: {{to: "{wallet}"}}, first: 1000) {{
+                    blockTime underlyingAmount cTokenSymbol
+                }}
+                borrow{i}: borrowEvents(where: {{borrower: "{wallet}"}}, first: 1000) {{
+                    blockTime underlyingAmount cTokenSymbol
+                }}
+                repay{i}: repayEvents(where: {{borrower: "{wallet}"}}, first: 1000) {{
+                    blockTime underlyingAmount cTokenSymbol
+                }}
+                redeem{i}: redeemEvents(where: {{from: "{wallet}"}}, first: 1000) {{
+                    blockTime underlyingAmount cTokenSymbol
+                }}
+                liquidation{i}: liquidationEvents(where: {{borrower: "{wallet}"}}, first: 1000) {{
+                    blockTime
+                }}
+            """)
+
+        return "query {" + "".join(parts) + "}"
+
+    def _fetch_batch(self, wallet_addresses, retries=3):
+        query = self._build_batch_query(wallet_addresses)
+
+        for attempt in range(retries):
+            try:
+                self._throttle()
+                response = self.session.post(
+                    self.api_url,
+                    json={"query": query},
+                    timeout=30
+                )
+                response.raise_for_status()
+                data = orjson.loads(response.content)
+
+                if "errors" in data:
+                    if attempt < retries - 1:
+                        time.sleep(2 ** attempt)
+                        continue
+                    return {}
+
+                payload = data.get("data") or {}
+                results = {}
+                for i, wallet in enumerate(wallet_addresses):
+                    results[wallet] = {
+                        'account': payload.get(f'account{i}'),
+                        'mintEvents': payload.get(f'mint{i}', []),
+                        'borrowEvents': payload.get(f'borrow{i}', []),
+                        'repayEvents': payload.get(f'repay{i}', []),
+                        'redeemEvents': payload.get(f'redeem{i}', []),
+                        'liquidationEvents': payload.get(f'liquidation{i}', [])
+                    }
+                return results
+
+            except Exception as e:
+                if attempt < retries - 1:
+                    time.sleep(2 ** attempt)
+                    continue
+
+        return {}
+
     def _simulate_wallet_data(self, wallet_address):
-        seed = int(hashlib.md5(wallet_address.encode()).hexdigest()[:8], 16)
-        random.seed(seed)
-
-        current_time = int(datetime.now().timestamp())
-        base_time = current_time - random.randint(86400 * 30, 86400 * 365)
-
-        wallet_type = seed % 5
-        tokens = ['cUSDC', 'cDAI', 'cUSDT', 'cWBTC', 'cETH']
-
-        if wallet_type == 0:  # Conservative
-            mint_events = [
-                {
-                    'blockTime': str(base_time + i * 86400 * random.randint(7, 30)), 
-                    'underlyingAmount': str(random.uniform(1000, 10000)), 
-                    'cTokenSymbol': random.choice(tokens[:3])
-                } for i in range(random.randint(3, 8))
-            ]
-            borrow_events = [
-                {
-                    'blockTime': str(base_time + i * 86400 * random.randint(30, 60)), 
-                    'underlyingAmount': str(random.uniform(500, 3000)), 
-                    'cTokenSymbol': random.choice(tokens[:2])
-                } for i in range(random.randint(1, 4))
-            ]
-            repay_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 86400 * 30), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 1.1), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in borrow_events
-            ]
-            redeem_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 86400 * 60), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 0.5), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in mint_events[:2]
-            ]
-            liquidation_events = []
-
-        elif wallet_type == 1:  # Risky
-            mint_events = [
-                {
-                    'blockTime': str(base_time + i * 86400), 
-                    'underlyingAmount': str(random.uniform(500, 2000)), 
-                    'cTokenSymbol': random.choice(tokens)
-                } for i in range(2)
-            ]
-            borrow_events = [
-                {
-                    'blockTime': str(base_time + i * 86400 * 7), 
-                    'underlyingAmount': str(random.uniform(3000, 8000)), 
-                    'cTokenSymbol': random.choice(tokens[:3])
-                } for i in range(random.randint(3, 6))
-            ]
-            repay_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 86400 * 10), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 0.4), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in borrow_events[:len(borrow_events)//2]
-            ]
-            redeem_events = []
-            liquidation_events = [
-                {
-                    'blockTime': str(base_time + 86400 * 60), 
-                    'repayAmount': str(random.uniform(2000, 5000)), 
-                    'seizeTokens': str(random.uniform(1000, 3000))
-                }
-            ]
-
-        elif wallet_type == 2:  # High frequency
-            mint_events = [
-                {
-                    'blockTime': str(base_time + i * 3600), 
-                    'underlyingAmount': str(random.uniform(100, 500)), 
-                    'cTokenSymbol': random.choice(tokens)
-                } for i in range(50)
-            ]
-            borrow_events = [
-                {
-                    'blockTime': str(base_time + i * 3600), 
-                    'underlyingAmount': str(random.uniform(100, 500)), 
-                    'cTokenSymbol': random.choice(tokens)
-                } for i in range(80)
-            ]
-            repay_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 3600), 
-                    'underlyingAmount': event['underlyingAmount'], 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in borrow_events
-            ]
-            redeem_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 3600 * 2), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 0.8), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in mint_events[:20]
-            ]
-            liquidation_events = []
-
-        elif wallet_type == 3:  # Defaulted
-            mint_events = [
-                {
-                    'blockTime': str(base_time), 
-                    'underlyingAmount': str(2000), 
-                    'cTokenSymbol': 'cUSDC'
-                }
-            ]
-            borrow_events = [
-                {
-                    'blockTime': str(base_time + 86400 * 7), 
-                    'underlyingAmount': str(5000), 
-                    'cTokenSymbol': 'cUSDC'
-                }
-            ]
-            repay_events = []
-            redeem_events = []
-            liquidation_events = [
-                {
-                    'blockTime': str(base_time + 86400 * 30), 
-                    'repayAmount': str(5000), 
-                    'seizeTokens': str(2000)
-                }
-            ]
-
-        else:  # Diversified
-            mint_events = [
-                {
-                    'blockTime': str(base_time + i * 86400 * 10), 
-                    'underlyingAmount': str(random.uniform(1000, 3000)), 
-                    'cTokenSymbol': random.choice(tokens)
-                } for i in range(5)
-            ]
-            borrow_events = [
-                {
-                    'blockTime': str(base_time + i * 86400 * 20), 
-                    'underlyingAmount': str(random.uniform(800, 2000)), 
-                    'cTokenSymbol': random.choice(tokens[:3])
-                } for i in range(3)
-            ]
-            repay_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 86400 * 15), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 0.9), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in borrow_events
-            ]
-            redeem_events = [
-                {
-                    'blockTime': str(int(event['blockTime']) + 86400 * 45), 
-                    'underlyingAmount': str(float(event['underlyingAmount']) * 0.3), 
-                    'cTokenSymbol': event['cTokenSymbol']
-                } for event in mint_events[:2]
-            ]
-            liquidation_events = []
-
-        unique_tokens = set([event['cTokenSymbol'] for event in mint_events + borrow_events])
-        account_tokens = []
-        for token in unique_tokens:
-            account_tokens.append({
-                'symbol': token,
-                'supplyBalanceUnderlying': str(random.uniform(0, 10000)),
-                'borrowBalanceUnderlying': str(random.uniform(0, 5000))
-            })
+        return _simulate_wallet_data(wallet_address)
+
+    def _simulate_all(self, wallet_addresses):
+        results = {}
+        to_simulate = []
+        for wallet in wallet_addresses:
+            if self.validate_wallet_address(wallet.lower()):
+                to_simulate.append(wallet)
+            else:
+                logger.error(f"Invalid wallet address: {wallet.lower()}")
+                results[wallet] = None
+
+        if len(to_simulate) >= self.PARALLEL_SIM_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+                simulated = executor.map(_simulate_wallet_data, [w.lower() for w in to_simulate], chunksize=64)
+                results.update(zip(to_simulate, simulated))
+        else:
+            for wallet in to_simulate:
+                results[wallet] = _simulate_wallet_data(wallet.lower())
+
+        return results
+
+    def _fetch_all(self, wallet_addresses):
+        if self.use_simulation:
+            return self._simulate_all(wallet_addresses)
+
+        valid_wallets = []
+        results = {}
+        for wallet in wallet_addresses:
+            if self.validate_wallet_address(wallet.lower()):
+                valid_wallets.append(wallet)
+            else:
+                logger.error(f"Invalid wallet address: {wallet}")
+                results[wallet] = None
+
+        uncached_wallets = []
+        for wallet in valid_wallets:
+            cached = self._cache_get(wallet.lower())
+            if cached is not None:
+                results[wallet] = cached
+            else:
+                uncached_wallets.append(wallet)
 
-        return {
-            'account': {
-                'tokens': account_tokens,
-                'countLiquidated': len(liquidation_events),
-                'hasBorrowed': len(borrow_events) > 0
-            },
-            'mintEvents': mint_events,
-            'borrowEvents': borrow_events,
-            'repayEvents': repay_events,
-            'redeemEvents': redeem_events,
-            'liquidationEvents': liquidation_events
-        }
+        if len(uncached_wallets) < len(valid_wallets):
+            logger.info(f"Cache hits: {len(valid_wallets) - len(uncached_wallets)}/{len(valid_wallets)} wallets")
+
+        batches = [uncached_wallets[i:i + self.BATCH_SIZE] for i in range(0, len(uncached_wallets), self.BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_batch, [w.lower() for w in batch]): batch
+                for batch in batches
+            }
+            done = 0
+            batches_done = 0
+            log_stride = max(len(batches) // 10, 1)
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_data = future.result()
+                except Exception as e:
+                    logger.error(f"Error fetching batch of {len(batch)} wallets: {e}")
+                    batch_data = {}
+
+                for wallet in batch:
+                    data = batch_data.get(wallet.lower())
+                    if data is None:
+                        logger.warning(f"Falling back to simulation for {wallet}")
+                        data = self._simulate_wallet_data(wallet.lower())
+                    else:
+                        self._cache_put(wallet.lower(), data)
+                    results[wallet] = data
+
+                done += len(batch)
+                batches_done += 1
+                if batches_done % log_stride == 0 or done == len(uncached_wallets):
+                    logger.info(f"Fetched {done}/{len(uncached_wallets)} wallets")
+
+        return results
 
     def fetch_wallet_data(self, wallet_address):
         wallet_address = wallet_address.lower()
@@ -291,9 +469,14 @@ class CompoundWalletScorer:
             return None
 
         if not self.use_simulation:
+            cached = self._cache_get(wallet_address)
+            if cached is not None:
+                return cached
+
             try:
                 data = self._fetch_from_thegraph(wallet_address)
                 if data:
+                    self._cache_put(wallet_address, data)
                     return data
             except Exception as e:
                 logger.warning(f"Falling back to simulation for {wallet_address}: {e}")
@@ -311,41 +494,44 @@ class CompoundWalletScorer:
             total_supply = sum(float(token.get('supplyBalanceUnderlying', 0)) for token in tokens)
             total_borrow = sum(float(token.get('borrowBalanceUnderlying', 0)) for token in tokens)
             
-            mint_events = data.get('mintEvents', [])
-            borrow_events = data.get('borrowEvents', [])
-            repay_events = data.get('repayEvents', [])
-            redeem_events = data.get('redeemEvents', [])
-            liquidation_events = data.get('liquidationEvents', [])
-
-            total_deposits = sum(float(event.get('underlyingAmount', 0)) for event in mint_events)
-            total_borrows = sum(float(event.get('underlyingAmount', 0)) for event in borrow_events)
-            total_repays = sum(float(event.get('underlyingAmount', 0)) for event in repay_events)
-            total_redeems = sum(float(event.get('underlyingAmount', 0)) for event in redeem_events)
-
-            deposit_count = len(mint_events)
-            borrow_count = len(borrow_events)
-            repay_count = len(repay_events)
-            redeem_count = len(redeem_events)
-            liquidation_count = len(liquidation_events)
+            sums = {}
+            counts = {}
+            unique_tokens = set()
+            min_ts = max_ts = None
+            ts_count = 0
+
+            for kind in self.EVENT_KINDS:
+                count = 0
+                amount = 0.0
+                for event in data.get(f'{kind}Events', []):
+                    count += 1
+                    amount += float(event.get('underlyingAmount', 0))
+                    if kind != 'liquidation':
+                        unique_tokens.add(event.get('cTokenSymbol', ''))
+                    block_time = event.get('blockTime')
+                    if block_time:
+                        block_time = int(block_time)
+                        ts_count += 1
+                        if min_ts is None or block_time < min_ts:
+                            min_ts = block_time
+                        if max_ts is None or block_time > max_ts:
+                            max_ts = block_time
+                counts[kind] = count
+                sums[kind] = amount
+
+            total_deposits = sums['mint']
+            total_borrows = sums['borrow']
+            total_repays = sums['repay']
+            total_redeems = sums['redeem']
 
             borrow_to_deposit_ratio = min(total_borrows / max(total_deposits, 1), 10)
             repay_rate = total_repays / max(total_borrows, 1)
             health_factor = total_supply / max(total_borrow, 1) if total_borrow > 0 else 100
+            unique_tokens_used = len(unique_tokens)
 
-            unique_tokens_used = len(set(
-                [event.get('cTokenSymbol', '') for event in 
-                 mint_events + borrow_events + repay_events + redeem_events]
-            ))
-
-            all_events = mint_events + borrow_events + repay_events + redeem_events + liquidation_events
-            if all_events:
-                timestamps = [int(event.get('blockTime', 0)) for event in all_events if event.get('blockTime')]
-                if timestamps:
-                    activity_duration = (max(timestamps) - min(timestamps)) / 86400
-                    activity_frequency = len(timestamps) / max(activity_duration, 1)
-                else:
-                    activity_duration = 0
-                    activity_frequency = 0
+            if ts_count:
+                activity_duration = (max_ts - min_ts) / 86400
+                activity_frequency = ts_count / max(activity_duration, 1)
             else:
                 activity_duration = 0
                 activity_frequency = 0
@@ -358,11 +544,11 @@ class CompoundWalletScorer:
                 'total_redeems': total_redeems,
                 'current_supply': total_supply,
                 'current_borrow': total_borrow,
-                'deposit_count': deposit_count,
-                'borrow_count': borrow_count,
-                'repay_count': repay_count,
-                'redeem_count': redeem_count,
-                'liquidation_count': liquidation_count,
+                'deposit_count': counts['mint'],
+                'borrow_count': counts['borrow'],
+                'repay_count': counts['repay'],
+                'redeem_count': counts['redeem'],
+                'liquidation_count': counts['liquidation'],
                 'borrow_to_deposit_ratio': borrow_to_deposit_ratio,
                 'repay_rate': repay_rate,
                 'health_factor': health_factor,
@@ -386,6 +572,96 @@ class CompoundWalletScorer:
             'activity_duration_days': 0, 'activity_frequency': 0
         }
 
+    def process_all_features(self, wallet_data):
+        wallets = list(wallet_data.keys())
+
+        event_rows = {'wallet_id': [], 'kind': [], 'amount': [], 'block_time': [], 'token': []}
+        token_rows = {'wallet_id': [], 'supply': [], 'borrow': []}
+
+        for wallet, data in wallet_data.items():
+            if not data:
+                continue
+
+            try:
+                account = data.get('account') or {}
+                for token in (account.get('tokens') or []):
+                    token_rows['wallet_id'].append(wallet)
+                    token_rows['supply'].append(float(token.get('supplyBalanceUnderlying', 0)))
+                    token_rows['borrow'].append(float(token.get('borrowBalanceUnderlying', 0)))
+
+                wallet_events = {'wallet_id': [], 'kind': [], 'amount': [], 'block_time': [], 'token': []}
+                for kind in self.EVENT_KINDS:
+                    for event in data.get(f'{kind}Events', []):
+                        wallet_events['wallet_id'].append(wallet)
+                        wallet_events['kind'].append(kind)
+                        wallet_events['amount'].append(float(event.get('underlyingAmount', 0)))
+                        wallet_events['block_time'].append(int(event.get('blockTime') or 0))
+                        wallet_events['token'].append(event.get('cTokenSymbol', ''))
+
+                for column in event_rows:
+                    event_rows[column].extend(wallet_events[column])
+
+            except Exception as e:
+                logger.error(f"Error processing features for {wallet}: {e}")
+
+        index = pd.Index(wallets, name='wallet_id')
+        events = pd.DataFrame({
+            'wallet_id': np.asarray(event_rows['wallet_id'], dtype=object),
+            'kind': np.asarray(event_rows['kind'], dtype=object),
+            'amount': np.asarray(event_rows['amount'], dtype=np.float64),
+            'block_time': np.asarray(event_rows['block_time'], dtype=np.int64),
+            'token': np.asarray(event_rows['token'], dtype=object)
+        })
+        kinds = list(self.EVENT_KINDS)
+
+        if len(events):
+            sums = (events.groupby(['wallet_id', 'kind'])['amount'].sum()
+                    .unstack(fill_value=0).reindex(index=index, columns=kinds, fill_value=0))
+            counts = (events.groupby(['wallet_id', 'kind']).size()
+                      .unstack(fill_value=0).reindex(index=index, columns=kinds, fill_value=0))
+            unique_tokens = (events[events['kind'] != 'liquidation']
+                             .groupby('wallet_id')['token'].nunique().reindex(index, fill_value=0))
+
+            timed = events[events['block_time'] > 0]
+            spans = timed.groupby('wallet_id')['block_time'].agg(['min', 'max', 'count']).reindex(index)
+            duration = (spans['max'] - spans['min']).fillna(0) / 86400
+            frequency = (spans['count'].fillna(0) / duration.clip(lower=1)).fillna(0)
+        else:
+            zeros = pd.Series(0.0, index=index)
+            sums = counts = pd.DataFrame({kind: zeros for kind in kinds})
+            unique_tokens = duration = frequency = zeros
+
+        if token_rows['wallet_id']:
+            balances = pd.DataFrame(token_rows).groupby('wallet_id')[['supply', 'borrow']].sum().reindex(index, fill_value=0)
+        else:
+            balances = pd.DataFrame({'supply': 0.0, 'borrow': 0.0}, index=index)
+
+        features = pd.DataFrame(index=index)
+        features['total_deposits'] = sums['mint']
+        features['total_borrows'] = sums['borrow']
+        features['total_repays'] = sums['repay']
+        features['total_redeems'] = sums['redeem']
+        features['current_supply'] = balances['supply']
+        features['current_borrow'] = balances['borrow']
+        features['deposit_count'] = counts['mint']
+        features['borrow_count'] = counts['borrow']
+        features['repay_count'] = counts['repay']
+        features['redeem_count'] = counts['redeem']
+        features['liquidation_count'] = counts['liquidation']
+        features['borrow_to_deposit_ratio'] = (features['total_borrows'] / features['total_deposits'].clip(lower=1)).clip(upper=10)
+        features['repay_rate'] = features['total_repays'] / features['total_borrows'].clip(lower=1)
+        features['health_factor'] = pd.Series(
+            np.where(features['current_borrow'] > 0,
+                     features['current_supply'] / features['current_borrow'].clip(lower=1),
+                     100.0),
+            index=index
+        )
+        features['unique_tokens_used'] = unique_tokens
+        features['activity_duration_days'] = duration
+        features['activity_frequency'] = frequency
+
+        return features.reset_index().astype(self.FEATURE_DTYPES)
+
     def calculate_risk_score(self, features):
         try:
             score = 1000
@@ -433,60 +709,104 @@ class CompoundWalletScorer:
             logger.error(f"Error calculating score for {features.get('wallet_id', 'unknown')}: {e}")
             return 500
 
+    def calculate_risk_scores(self, features_df):
+        scores = np.full(len(features_df), 1000, dtype=np.int64)
+
+        liquidations = features_df['liquidation_count'].to_numpy()
+        scores -= np.minimum(liquidations * 50, 300).astype(np.int64)
+
+        borrow_ratio = features_df['borrow_to_deposit_ratio'].to_numpy()
+        scores += np.select([borrow_ratio > 5, borrow_ratio > 2, borrow_ratio > 1], [-200, -100, -50], default=0)
+
+        repay_rate = features_df['repay_rate'].to_numpy()
+        scores += np.select([repay_rate < 0.3, repay_rate < 0.7, repay_rate > 1.2], [-150, -75, 25], default=0)
+
+        frequency = features_df['activity_frequency'].to_numpy()
+        scores += np.select([frequency > 50, frequency < 0.01], [-100, -50], default=0)
+
+        health = features_df['health_factor'].to_numpy()
+        scores += np.select([health < 1.1, health < 1.5, health > 10], [-200, -100, 25], default=0)
+
+        tokens = features_df['unique_tokens_used'].to_numpy()
+        scores += np.select([tokens > 3, tokens > 1], [50, 25], default=0)
+
+        borrows = features_df['total_borrows'].to_numpy()
+        deposits = features_df['total_deposits'].to_numpy()
+        scores -= np.where((borrows > 0) & (deposits == 0), 100, 0)
+
+        return np.clip(scores, 0, 1000)
+
     def process_wallets(self, wallets_file='wallets.csv'):
         if not os.path.exists(wallets_file):
             raise FileNotFoundError(f"Wallets file not found: {wallets_file}")
             
         try:
-            wallets_df = pd.read_csv(wallets_file)
+            wallets_df = pd.read_csv(wallets_file, usecols=['wallet_id'], dtype={'wallet_id': str})
+        except ValueError as e:
+            if 'Usecols' in str(e):
+                raise ValueError("Wallets file must contain 'wallet_id' column")
+            raise ValueError(f"Error reading wallets file: {e}")
         except Exception as e:
             raise ValueError(f"Error reading wallets file: {e}")
-            
-        if 'wallet_id' not in wallets_df.columns:
-            raise ValueError("Wallets file must contain 'wallet_id' column")
 
-        wallet_addresses = wallets_df['wallet_id'].tolist()
+        wallet_addresses = pd.unique(wallets_df['wallet_id'].dropna().str.lower()).tolist()
+        if len(wallet_addresses) < len(wallets_df):
+            logger.info(f"Dropped {len(wallets_df) - len(wallet_addresses)} duplicate or empty wallet rows")
         logger.info(f"Processing {len(wallet_addresses)} wallets...")
 
-        features_list = []
-        for i, wallet in enumerate(wallet_addresses, 1):
-            try:
-                data = self.fetch_wallet_data(wallet)
-                features = self.process_wallet_features(data, wallet)
-                if features:
-                    features_list.append(features)
-                    
-                if i % 10 == 0:
-                    logger.info(f"Completed {i}/{len(wallet_addresses)} wallets")
-                    
-            except Exception as e:
-                logger.error(f"Error processing wallet {wallet}: {e}")
-                features_list.append(self._get_default_features(wallet))
+        out_ids = np.empty(len(wallet_addresses), dtype=object)
+        out_scores = np.empty(len(wallet_addresses), dtype=np.int16)
+        feature_frames = []
+        pos = 0
 
-        self.features_df = pd.DataFrame(features_list)
-        
-        scores_list = []
-        for _, features in self.features_df.iterrows():
-            score = self.calculate_risk_score(features.to_dict())
-            scores_list.append({
-                'wallet_id': features['wallet_id'],
-                'score': score
-            })
-        
-        self.scores_df = pd.DataFrame(scores_list)
+        for start in range(0, len(wallet_addresses), self.CHUNK_SIZE):
+            chunk = wallet_addresses[start:start + self.CHUNK_SIZE]
+            wallet_data = self._fetch_all(chunk)
+            features = self.process_all_features({wallet: wallet_data.get(wallet) for wallet in chunk})
+            scores = self.calculate_risk_scores(features)
+
+            out_ids[pos:pos + len(features)] = features['wallet_id'].to_numpy()
+            out_scores[pos:pos + len(features)] = scores.astype(np.int16)
+            feature_frames.append(features)
+            pos += len(features)
+
+        if feature_frames:
+            self.features_df = pd.concat(feature_frames, ignore_index=True)
+        else:
+            self.features_df = self.process_all_features({})
+
+        self.scores_df = pd.DataFrame({'wallet_id': out_ids[:pos], 'score': out_scores[:pos]})
         self.scores_df = self.scores_df.sort_values('wallet_id').reset_index(drop=True)
         
         logger.info(f"Successfully processed {len(self.scores_df)} wallets")
         return self.scores_df
 
-    def save_results(self, features_file='wallet_features.csv', scores_file='wallet_scores.csv'):
+    @staticmethod
+    def _write_csv_atomic(df, path):
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def _write_parquet(self, df, csv_file):
+        parquet_file = os.path.splitext(csv_file)[0] + '.parquet'
+        try:
+            df.to_parquet(parquet_file, index=False)
+            logger.info(f"Parquet copy saved to {parquet_file}")
+        except ImportError:
+            logger.warning("Parquet output requires pyarrow; skipping")
+
+    def save_results(self, features_file='wallet_features.csv', scores_file='wallet_scores.csv', parquet=False):
         if self.features_df is not None:
-            self.features_df.to_csv(features_file, index=False)
+            self._write_csv_atomic(self.features_df, features_file)
             logger.info(f"Features saved to {features_file}")
+            if parquet:
+                self._write_parquet(self.features_df, features_file)
 
         if self.scores_df is not None:
-            self.scores_df.to_csv(scores_file, index=False)
+            self._write_csv_atomic(self.scores_df, scores_file)
             logger.info(f"Scores saved to {scores_file}")
+            if parquet:
+                self._write_parquet(self.scores_df, scores_file)
 
     def get_summary(self):
         if self.scores_df is None:
@@ -505,9 +825,10 @@ class CompoundWalletScorer:
 
 class TestCompoundWalletScorer(unittest.TestCase):
     
-    def setUp(self):
-        self.scorer = CompoundWalletScorer(use_simulation=True)
-        self.sample_wallet = "0x1234567890123456789012345678901234567890"
+    @classmethod
+    def setUpClass(cls):
+        cls.scorer = CompoundWalletScorer(use_simulation=True)
+        cls.sample_wallet = "0x1234567890123456789012345678901234567890"
         
     def test_wallet_address_validation(self):
         self.assertTrue(self.scorer.validate_wallet_address("0x1234567890123456789012345678901234567890"))
@@ -537,6 +858,22 @@ class TestCompoundWalletScorer(unittest.TestCase):
         self.assertGreaterEqual(features['total_deposits'], 0)
         self.assertLessEqual(features['borrow_to_deposit_ratio'], 10)
 
+    def test_feature_extraction_edge_cases(self):
+        empty_events = {f'{kind}Events': [] for kind in CompoundWalletScorer.EVENT_KINDS}
+        cases = [
+            ('no_data', None),
+            ('empty_dict', {}),
+            ('no_events', dict(empty_events, account={'tokens': []})),
+            ('no_account', dict(empty_events, account=None)),
+        ]
+        for name, data in cases:
+            with self.subTest(case=name):
+                features = self.scorer.process_wallet_features(data, self.sample_wallet)
+                self.assertEqual(features['wallet_id'], self.sample_wallet)
+                self.assertEqual(features['total_deposits'], 0)
+                self.assertEqual(features['liquidation_count'], 0)
+                self.assertEqual(features['activity_frequency'], 0)
+
     def test_risk_score_calculation(self):
         safe_features = {
             'wallet_id': self.sample_wallet,
@@ -597,6 +934,7 @@ def main():
     parser.add_argument('--wallets-file', default='wallets.csv', help='Input CSV file with wallet addresses')
     parser.add_argument('--workers', type=int, default=5, help='Number of concurrent workers')
     parser.add_argument('--quiet', action='store_true', help='Suppress info-level logging')
+    parser.add_argument('--parquet', action='store_true', help='Also write results as Parquet (requires pyarrow)')
     parser.add_argument('--test', action='store_true', help='Run unit tests and exit')
     
     args = parser.parse_args()
@@ -622,7 +960,7 @@ def main():
         scores_df = scorer.process_wallets(args.wallets_file)
         processing_time = time.time() - start_time
         
-        scorer.save_results()
+        scorer.save_results(parquet=args.parquet)
         stats = scorer.get_summary()
         
         print(f"\nProcessing Summary:")
@@ -636,9 +974,8 @@ def main():
         print(f"   wallet_features.csv - Detailed features for analysis")
         print(f"   wallet_scoring.log - Processing logs")
         
-        high_risk = len(scores_df[scores_df['score'] < 400])
-        medium_risk = len(scores_df[(scores_df['score'] >= 400) & (scores_df['score'] < 700)])
-        low_risk = len(scores_df[scores_df['score'] >= 700])
+        risk_counts, _ = np.histogram(scores_df['score'].to_numpy(), bins=[0, 400, 700, 1001])
+        high_risk, medium_risk, low_risk = risk_counts
         
         print(f"\nRisk Distribution:")
         print(f"   High Risk (0-400): {high_risk} wallets")